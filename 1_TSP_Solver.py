@@ -2,9 +2,8 @@ import pandas as pd
 import streamlit as st
 
 from utilities import Utilities
-from location import Locations
 from database import Database
-from tsp import TSP
+from prewarm import Prewarm
 
 # Streamlit wants this for FutureWarning on some python versions
 try:
@@ -19,6 +18,15 @@ st.set_page_config(
 
 Utilities.title_above_navbar()
 
+@st.cache_resource
+def prewarm():
+    '''
+    Runs the optional prewarm step once per server process.
+    '''
+    return Prewarm.start()
+
+prewarm()
+
 def main():
     '''
     Main function for the Streamlit home page.
@@ -61,6 +69,10 @@ def main():
                     st.warning('Please enter at least two locations.')
 
                 else:
+                    # The solver stack is only imported once a solve is requested.
+                    from location import Locations
+                    from tsp import TSP
+
                     progress_bar = st.progress(
                         0, text='Geocoding locations. Please wait.')
 
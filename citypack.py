@@ -0,0 +1,355 @@
+import json
+import math
+import os
+import re
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+import networkx as nx
+import numpy as np
+
+from constants import Constants
+
+
+class CityPack(Constants):
+    # Inherit the constants from the Constants class
+
+    # The pack named by CITY_PACK is loaded once per process.
+    _active: Optional['CityPack'] = None
+    _active_loaded = False
+    _lock = threading.Lock()
+
+    def __init__(self, folder: str) -> None:
+        '''
+        Offline road graph, spatial index and address gazetteer for one city.
+        All arrays are memory-mapped read-only, so worker processes share the same pages.
+
+        Graph: nodes sorted by OSM id, edges in CSR form (indptr, indices, lengths in metres).
+        Spatial index: node ordinals sorted by grid cell, with the offset of each cell.
+        Gazetteer: normalized addresses sorted for binary search, with their coordinates.
+        '''
+        self.folder = folder
+
+        with open(os.path.join(folder, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        for name in self.PACK_ARRAYS:
+            setattr(self, name, np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='r'))
+
+        # Extent of the grid, bounds the nearest node search.
+        rows = self.grid_cells // 2**21 - 2**20
+        cols = self.grid_cells % 2**21 - 2**20
+        self.grid_rows = (int(rows.min()), int(rows.max())) if len(rows) else (0, 0)
+        self.grid_cols = (int(cols.min()), int(cols.max())) if len(cols) else (0, 0)
+
+    @classmethod
+    def active(cls) -> Optional['CityPack']:
+        '''
+        Returns the pack in the CITY_PACK folder, or None if it is not set.
+        '''
+        with cls._lock:
+            if not cls._active_loaded:
+                load_dotenv()
+                folder = os.getenv('CITY_PACK')
+                cls._active = cls(folder) if folder else None
+                cls._active_loaded = True
+
+        return cls._active
+
+    @property
+    def identity(self) -> Dict:
+        '''
+        Identifies the pack and the extract it was built from.
+        Part of the solution cache key, so tours from different graphs are never mixed.
+        '''
+        return {
+            'folder': os.path.abspath(self.folder),
+            **{key: self.meta.get(key) for key in ('source', 'nodes', 'edges')},
+        }
+
+    @staticmethod
+    def normalize(address: str) -> str:
+        '''
+        Normalizes the street part of an address for the gazetteer.
+        "123 Main Street, Houston, TX" -> "123 main st"
+        '''
+        street = address.split(',')[0].lower()
+        words = re.sub(r'[^a-z0-9 ]', ' ', street).split()
+        return ' '.join(Constants.ADDRESS_ABBREVIATIONS.get(word, word) for word in words)
+
+    def geocode(self, address: str) -> Tuple[float, float]:
+        '''
+        Looks up an address in the gazetteer.
+        Returns (lat, lon) like ox.geocode, raises LookupError if it is not found.
+        '''
+        key = self.normalize(address).encode()
+        i = int(np.searchsorted(self.addr_keys, key))
+
+        if i == len(self.addr_keys) or self.addr_keys[i] != key:
+            raise LookupError(f'Address not in city pack: {address}')
+
+        return float(self.addr_lat[i]), float(self.addr_lon[i])
+
+    def __cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        size = self.meta['grid_size']
+        return math.floor(lat / size), math.floor(lon / size)
+
+    def __cell_nodes(self, row: int, col: int) -> np.ndarray:
+        '''
+        Returns the ordinals of the nodes in one grid cell.
+        '''
+        cell = self.__cell_id(row, col)
+        k = int(np.searchsorted(self.grid_cells, cell))
+        if k == len(self.grid_cells) or self.grid_cells[k] != cell:
+            return np.empty(0, dtype=np.int32)
+        return self.grid_order[self.grid_offsets[k]:self.grid_offsets[k + 1]]
+
+    @staticmethod
+    def __cell_id(row, col):
+        # Works on ints and numpy arrays.
+        # Rows and columns are offset so the combined id stays positive and sorts by row, then column.
+        return (row + 2**20) * 2**21 + (col + 2**20)
+
+    def __ring(self, row: int, col: int, r: int) -> List[Tuple[int, int]]:
+        '''
+        Returns the grid cells at Chebyshev distance r from (row, col).
+        '''
+        if r == 0:
+            return [(row, col)]
+        top_bottom = [(row + dr, col + dc) for dr in (-r, r) for dc in range(-r, r + 1)]
+        sides = [(row + dr, col + dc) for dc in (-r, r) for dr in range(-r + 1, r)]
+        return top_bottom + sides
+
+    def __nearest_node(self, lat: float, lon: float) -> int:
+        '''
+        Returns the ordinal of the node nearest to a point.
+        Searches grid rings outwards until no closer node can be in the next ring.
+        '''
+        row, col = self.__cell(lat, lon)
+        # Shortest side of a cell in metres, the east-west side shrinks with latitude.
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        side = self.meta['grid_size'] * 111320 * cos_lat
+        max_ring = max(abs(row - self.grid_rows[0]), abs(row - self.grid_rows[1]),
+                       abs(col - self.grid_cols[0]), abs(col - self.grid_cols[1]))
+
+        best, best_dist = None, math.inf
+        for r in range(max_ring + 1):
+            # Nodes in ring r are at least r - 1 full cells away.
+            if best_dist <= (r - 1) * side:
+                break
+
+            cells = [self.__cell_nodes(*cell) for cell in self.__ring(row, col, r)]
+            candidates = np.concatenate(cells) if cells else np.empty(0, dtype=np.int32)
+            if not len(candidates):
+                continue
+
+            dy = (self.lat[candidates] - lat) * 111320
+            dx = (self.lon[candidates] - lon) * 111320 * cos_lat
+            dist = np.hypot(dx, dy)
+            k = int(np.argmin(dist))
+            if dist[k] < best_dist:
+                best, best_dist = int(candidates[k]), float(dist[k])
+
+        if best is None:
+            raise LookupError('City pack has no nodes.')
+
+        return best
+
+    def nearest_nodes(self, lats, lons) -> List[int]:
+        '''
+        Offline equivalent of ox.nearest_nodes, using the grid index.
+        Returns the OSM node id nearest to each (lat, lon).
+        '''
+        return [int(self.node_ids[self.__nearest_node(float(lat), float(lon))])
+                for lat, lon in zip(lats, lons)]
+
+    def node_index(self, node: int) -> int:
+        '''
+        Returns the ordinal of an OSM node id, raises KeyError if it is not in the pack.
+        '''
+        k = int(np.searchsorted(self.node_ids, node))
+        if k == len(self.node_ids) or self.node_ids[k] != node:
+            raise KeyError(node)
+        return k
+
+    def __contains__(self, node: int) -> bool:
+        try:
+            self.node_index(node)
+            return True
+        except KeyError:
+            return False
+
+    def neighbors(self, u: int) -> Iterator[Tuple[int, float]]:
+        '''
+        Returns (ordinal, length in metres) of the out-neighbours of node ordinal u, from the CSR arrays.
+        '''
+        start, end = int(self.indptr[u]), int(self.indptr[u + 1])
+        return zip(self.indices[start:end].tolist(), self.lengths[start:end].tolist())
+
+    def graph_from_paths(self, paths: List[List[int]]) -> nx.MultiDiGraph:
+        '''
+        Builds a small graph of just the given node paths, with x and y like an osmnx graph.
+        Used to draw the route, the solve itself runs on the arrays.
+        '''
+        G = nx.MultiDiGraph(crs='epsg:4326')
+        for path in paths:
+            for node in path:
+                k = self.node_index(node)
+                G.add_node(int(node), y=float(self.lat[k]), x=float(self.lon[k]))
+            nx.add_path(G, [int(node) for node in path])
+
+        return G
+
+    @classmethod
+    def build(cls, osm_path: str, folder: str) -> 'CityPack':
+        '''
+        Builds a pack from an OSM XML extract (.osm).
+        Convert .pbf extracts first, e.g. with: osmium cat city.osm.pbf -o city.osm
+        '''
+        # Only needed to build the pack, not to load it.
+        import osmnx as ox
+
+        os.makedirs(folder, exist_ok=True)
+
+        # Keep every tag the drive filter looks at on the edges.
+        useful_tags_way = ox.settings.useful_tags_way
+        ox.settings.useful_tags_way = list(dict.fromkeys([*useful_tags_way, *cls.PACK_DRIVE_EXCLUDE]))
+        try:
+            G = ox.graph_from_xml(osm_path, simplify=False)
+        finally:
+            ox.settings.useful_tags_way = useful_tags_way
+
+        G = cls.__drive_graph(G, ox)
+        arrays = {**cls.__graph_arrays(G), **cls.__gazetteer_arrays(osm_path)}
+        arrays.update(cls.__grid_arrays(arrays['lat'], arrays['lon']))
+
+        for name in cls.PACK_ARRAYS:
+            np.save(os.path.join(folder, f'{name}.npy'), arrays[name])
+
+        with open(os.path.join(folder, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'source': os.path.basename(osm_path),
+                'grid_size': cls.PACK_GRID_SIZE,
+                'nodes': len(arrays['node_ids']),
+                'edges': len(arrays['indices']),
+                'addresses': len(arrays['addr_keys']),
+            }, f)
+
+        return cls(folder)
+
+    @classmethod
+    def __drive_graph(cls, G: nx.MultiDiGraph, ox) -> nx.MultiDiGraph:
+        '''
+        Keeps the drivable roads, simplifies and keeps the largest strongly connected component.
+        Uses the same tag rules as the osmnx 'drive' network type, see PACK_DRIVE_EXCLUDE.
+        '''
+        def values(value) -> set:
+            # Tags can be lists after merging, or ';' separated in OSM.
+            value = value if isinstance(value, list) else [value]
+            return {part.strip() for v in value if v is not None for part in str(v).split(';')}
+
+        def drivable(data: Dict) -> bool:
+            if data.get('highway') is None:
+                return False
+            return not any(values(data.get(tag)) & excluded for tag, excluded in cls.PACK_DRIVE_EXCLUDE.items())
+
+        G.remove_edges_from([(u, v, k) for u, v, k, data in G.edges(keys=True, data=True)
+                             if not drivable(data)])
+        G.remove_nodes_from(list(nx.isolates(G)))
+
+        G = ox.simplify_graph(G)
+        return ox.truncate.largest_component(G, strongly=True)
+
+    @staticmethod
+    def __graph_arrays(G: nx.MultiDiGraph) -> Dict[str, np.ndarray]:
+        '''
+        Converts the graph to sorted node arrays and a CSR adjacency.
+        Parallel edges are reduced to the shortest one, like nx.shortest_path does.
+        '''
+        node_ids = np.array(sorted(G.nodes), dtype=np.int64)
+        index = {node: i for i, node in enumerate(node_ids.tolist())}
+
+        lengths = {}
+        for u, v, length in G.edges(data='length'):
+            key = (index[u], index[v])
+            lengths[key] = min(length, lengths.get(key, math.inf))
+
+        edges = sorted(lengths.items())
+        sources = np.array([u for (u, _), _ in edges], dtype=np.int64)
+
+        return {
+            'node_ids': node_ids,
+            'lat': np.array([G.nodes[node]['y'] for node in node_ids.tolist()], dtype=np.float64),
+            'lon': np.array([G.nodes[node]['x'] for node in node_ids.tolist()], dtype=np.float64),
+            'indptr': np.searchsorted(sources, np.arange(len(node_ids) + 1)).astype(np.int64),
+            'indices': np.array([v for (_, v), _ in edges], dtype=np.int32),
+            'lengths': np.array([length for _, length in edges], dtype=np.float32),
+        }
+
+    @classmethod
+    def __grid_arrays(cls, lat: np.ndarray, lon: np.ndarray) -> Dict[str, np.ndarray]:
+        '''
+        Buckets the nodes into a lat/lon grid.
+        '''
+        rows = np.floor(lat / cls.PACK_GRID_SIZE).astype(np.int64)
+        cols = np.floor(lon / cls.PACK_GRID_SIZE).astype(np.int64)
+        cells = cls.__cell_id(rows, cols)
+
+        order = np.argsort(cells, kind='stable')
+        grid_cells, offsets = np.unique(cells[order], return_index=True)
+
+        return {
+            'grid_cells': grid_cells,
+            'grid_offsets': np.append(offsets, len(order)).astype(np.int64),
+            'grid_order': order.astype(np.int32),
+        }
+
+    @classmethod
+    def __gazetteer_arrays(cls, osm_path: str) -> Dict[str, np.ndarray]:
+        '''
+        Collects the addresses (addr:housenumber and addr:street) of nodes and ways.
+        Ways are placed at the mean of their nodes.
+        '''
+        coords = {}
+        addresses = {}
+
+        for _, element in ET.iterparse(osm_path, events=('end',)):
+            if element.tag not in ('node', 'way'):
+                continue
+
+            tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+
+            if element.tag == 'node':
+                point = (float(element.get('lat')), float(element.get('lon')))
+                coords[element.get('id')] = point
+            else:
+                points = [coords[nd.get('ref')] for nd in element.iter('nd') if nd.get('ref') in coords]
+                point = tuple(np.mean(points, axis=0)) if points else None
+
+            if point and 'addr:housenumber' in tags and 'addr:street' in tags:
+                key = cls.normalize(f"{tags['addr:housenumber']} {tags['addr:street']}")
+                # First occurrence wins, duplicates are usually the same building.
+                addresses.setdefault(key, point)
+
+            element.clear()
+
+        keys = sorted(addresses)
+        return {
+            'addr_keys': np.array([key.encode() for key in keys], dtype=bytes),
+            'addr_lat': np.array([addresses[key][0] for key in keys], dtype=np.float64),
+            'addr_lon': np.array([addresses[key][1] for key in keys], dtype=np.float64),
+        }
+
+
+if __name__ == '__main__':
+    # python citypack.py <extract.osm> <pack folder>
+    if len(sys.argv) != 3:
+        print('Usage: python citypack.py <extract.osm> <pack folder>')
+        sys.exit(1)
+
+    pack = CityPack.build(sys.argv[1], sys.argv[2])
+    print(f"Built city pack {pack.folder}: {pack.meta['nodes']} nodes, "
+          f"{pack.meta['edges']} edges, {pack.meta['addresses']} addresses")
@@ -5,6 +5,70 @@ class Constants():
     # Scale constants
     SCALE_FACTOR = 100
 
+    # Matrix constants
+    # int32 holds up to ~21,000 km at SCALE_FACTOR 100, float32 keeps raw metres to the centimetre.
+    MATRIX_DTYPE = 'int32'
+    RAW_MATRIX_DTYPE = 'float32'
+
+    # Path constants
+    # Graph node ordinals in a predecessor array, and how many unpacked legs to keep.
+    PREDECESSOR_DTYPE = 'int32'
+    PATH_CACHE_SIZE = 256
+
+    # Graph constants
+    # Road graphs kept in memory per process. Drive graphs can be hundreds of MB, so only a couple.
+    # A cached graph is reused if every stop is at least GRAPH_COVER_MARGIN metres inside its extent.
+    GRAPH_CACHE_SIZE = 2
+    GRAPH_COVER_MARGIN = 1000
+
+    # Startup constants
+    # Heavy modules loaded by the prewarm step, and the pages whose import time is reported.
+    SOLVER_MODULES = ['networkx', 'geopandas', 'osmnx', 'folium', 'ortools.constraint_solver.pywrapcp',
+                      'location', 'tsp']
+    PAGES = ['1_TSP_Solver.py', 'pages/2_Database_Editor.py']
+
+    # Database constants
+    # The snapshot is checked for updated rows at most every SNAPSHOT_REFRESH_SECONDS,
+    # and fully re-pulled after SNAPSHOT_TTL_SECONDS to pick up deletes from other processes.
+    # Incremental pulls re-read SNAPSHOT_LOOKBACK_SECONDS before the newest seen row, see sql/001_locations_updated_at.sql.
+    UPDATED_AT_COLUMN = 'updated_at'
+    SNAPSHOT_REFRESH_SECONDS = 30
+    SNAPSHOT_LOOKBACK_SECONDS = 60
+    SNAPSHOT_TTL_SECONDS = 600
+
+    # Solution cache constants
+    # A cached tour containing at least SOLUTION_WARM_START_OVERLAP of the current stops is used as a warm start.
+    # Each depot and settings group keeps at most SOLUTION_CACHE_MAX_ENTRIES tours.
+    SOLUTION_CACHE_FOLDER = 'cache/solutions'
+    SOLUTION_WARM_START_OVERLAP = 0.8
+    SOLUTION_CACHE_MAX_ENTRIES = 200
+
+    # City pack constants
+    # Arrays stored in a pack folder, and grid cell size in degrees (~1 km).
+    # PACK_DRIVE_EXCLUDE mirrors the osmnx 'drive' network filter: a way is left out
+    # if any of these tags has one of the listed values, or if it has no highway tag.
+    # Values are compared exactly (split on ';'), osmnx matches them as regular expressions.
+    PACK_ARRAYS = ['node_ids', 'lat', 'lon', 'indptr', 'indices', 'lengths',
+                   'grid_cells', 'grid_offsets', 'grid_order',
+                   'addr_keys', 'addr_lat', 'addr_lon']
+    PACK_GRID_SIZE = 0.01
+    PACK_DRIVE_EXCLUDE = {
+        'highway': {'abandoned', 'bridleway', 'bus_guideway', 'construction', 'corridor', 'cycleway',
+                    'elevator', 'escalator', 'footway', 'no', 'path', 'pedestrian', 'planned', 'platform',
+                    'proposed', 'raceway', 'razed', 'service', 'steps', 'track'},
+        'area': {'yes'},
+        'access': {'private'},
+        'motor_vehicle': {'no'},
+        'motorcar': {'no'},
+        'service': {'alley', 'driveway', 'emergency_access', 'parking', 'parking_aisle', 'private'},
+    }
+    ADDRESS_ABBREVIATIONS = {
+        'street': 'st', 'avenue': 'ave', 'road': 'rd', 'drive': 'dr', 'boulevard': 'blvd',
+        'lane': 'ln', 'court': 'ct', 'place': 'pl', 'parkway': 'pkwy', 'highway': 'hwy',
+        'freeway': 'fwy', 'circle': 'cir', 'terrace': 'ter', 'square': 'sq', 'trail': 'trl',
+        'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+    }
+
     # HTML constants
     HTML_BASE = '''
         <div id="legend" style="position: fixed; 
@@ -1,41 +1,94 @@
 import os
-from typing import List, Dict
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 import supabase
 import pandas as pd
 
+from constants import Constants
 from utilities import Utilities
 
-class Database():
-    def __init__(self) -> None:
-        load_dotenv()
-        self.supabase_url = os.getenv('SUPABASE_URL')
-        self.supabase_key = os.getenv('SUPABASE_KEY')
+class Database(Constants):
+    # Inherit the constants from the Constants class
+
+    # Process-wide state shared by every instance.
+    # Streamlit creates a Database on every rerun, so the client and snapshot live on the class.
+    _clients: Dict[Tuple[str, str], supabase.Client] = {}
+    _snapshots: Dict[Tuple[str, str], 'Snapshot'] = {}
+    _lock = threading.Lock()
+    _env_loaded = False
+
+    def __init__(self, supabase_url: Optional[str] = None, supabase_key: Optional[str] = None) -> None:
+        '''
+        Url and key default to SUPABASE_URL and SUPABASE_KEY.
+        Passing them explicitly allows pointing at a local stand-in server.
+        '''
+        if not Database._env_loaded:
+            load_dotenv()
+            Database._env_loaded = True
+
+        self.supabase_url = supabase_url or os.getenv('SUPABASE_URL')
+        self.supabase_key = supabase_key or os.getenv('SUPABASE_KEY')
         self.client = self.__connect()
 
+    @property
+    def __pool_key(self) -> Tuple[str, str]:
+        return (self.supabase_url, self.supabase_key)
+
     def __connect(self) -> supabase.Client:
         '''
         Private method to connect to the Supabase database.
+        Clients are pooled per url and key, so each process connects once.
         '''
-        try:
-            client = supabase.create_client(self.supabase_url, self.supabase_key)
-            return client
-        
-        except Exception as e:
-            print(f'Error connecting to Supabase: {e}')
+        with Database._lock:
+            if self.__pool_key in Database._clients:
+                return Database._clients[self.__pool_key]
+
+            try:
+                client = supabase.create_client(self.supabase_url, self.supabase_key)
+                Database._clients[self.__pool_key] = client
+                Database._snapshots[self.__pool_key] = Snapshot()
+                return client
 
-    def pull(self) -> Dict[str, List[str]]:
+            except Exception as e:
+                print(f'Error connecting to Supabase: {e}')
+
+    @property
+    def snapshot(self) -> 'Snapshot':
+        '''
+        The local copy of the locations table for this client.
+        '''
+        return Database._snapshots.setdefault(self.__pool_key, Snapshot())
+
+    def invalidate(self) -> None:
+        '''
+        Forces a full refresh on the next pull.
+        '''
+        self.snapshot.invalidate()
+
+    def pull(self, city: Optional[str] = None) -> Dict[str, List[str]]:
         '''
         Pulls all records from the locations table.
         Formats them into Dict[str, List[str]].
+
+        Served from the local snapshot, which is refreshed incrementally.
+        If only one city is requested and there is no snapshot yet,
+        only that city is queried.
         '''
         try:
-            response = self.client.from_('locations').select('*').execute()
-            locations = response.data 
-            locations = Utilities.format_locations(locations)
-            return locations
-        
+            if city is not None and not self.snapshot.loaded:
+                response = self.client.from_('locations').select('*').eq('city', city).execute()
+                return Utilities.format_locations(response.data)
+
+            locations = self.snapshot.refresh(self.client)
+            if city is not None:
+                locations = [row for row in locations if row['city'] == city]
+
+            return Utilities.format_locations(locations)
+
         except Exception as e:
             print(f'Error pulling data from Supabase: {e}')
             return {}
@@ -63,7 +116,11 @@ class Database():
         if changes['deletes']:
             # the delete method deletes entries and returns True upon success.
             changes_success = self.__delete(changes['deletes'])
-                    
+
+        if changes_success != 'NO CHANGES MADE':
+            # Even a partial failure may have changed the table.
+            self.invalidate()
+
         return changes_success
 
     def __delete(self, addresses: list) -> bool:
@@ -77,7 +134,7 @@ class Database():
             return True
         except Exception:
             return False
-        
+
     def delete_city(self, city: str) -> bool:
         '''
         Deletes all records in the DB with the specified city.
@@ -87,4 +144,79 @@ class Database():
             return True
         except Exception as e:
             return False
+        finally:
+            self.invalidate()
+
+
+class Snapshot(Constants):
+    # Inherit the constants from the Constants class
+    def __init__(self) -> None:
+        '''
+        Local copy of the locations table.
+        Rows are keyed by id and refreshed with updated-at based incremental pulls.
+        The updated_at column and its trigger come from sql/001_locations_updated_at.sql.
+        Without it, the snapshot is fully re-pulled every SNAPSHOT_REFRESH_SECONDS instead.
+        Deletes by other processes are only seen on the periodic full refresh.
+        '''
+        self.rows: Dict = {}
+        self.loaded = False
+        self.last_updated: Optional[str] = None
+        self.last_full = 0.0
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        '''
+        Drops the snapshot so the next refresh pulls the full table.
+        '''
+        with self.lock:
+            self.rows = {}
+            self.loaded = False
+            self.last_updated = None
+
+    def __row_key(self, row: Dict):
+        # Fall back to the address if the table has no id column.
+        return row.get('id', (row.get('city'), row.get('address')))
+
+    def __merge(self, rows: List[Dict]) -> None:
+        '''
+        Merges rows into the snapshot and tracks the newest updated-at value.
+        Rows are keyed, so rows pulled again by an overlapping refresh are not duplicated.
+        '''
+        for row in rows:
+            self.rows[self.__row_key(row)] = row
+
+            updated = row.get(self.UPDATED_AT_COLUMN)
+            # Server timestamps share one format, so they compare as strings.
+            if updated is not None and (self.last_updated is None or updated > self.last_updated):
+                self.last_updated = updated
+
+    def refresh(self, client: supabase.Client) -> List[Dict]:
+        '''
+        Brings the snapshot up to date and returns its rows.
+        Full pull if empty or older than SNAPSHOT_TTL_SECONDS,
+        otherwise only rows updated since the last pull, at most every SNAPSHOT_REFRESH_SECONDS.
+        Tables without the updated-at column are fully re-pulled every SNAPSHOT_REFRESH_SECONDS.
+        '''
+        with self.lock:
+            now = time.monotonic()
+            refresh_due = now - self.last_check > self.SNAPSHOT_REFRESH_SECONDS
+
+            if (not self.loaded or now - self.last_full > self.SNAPSHOT_TTL_SECONDS
+                    or (refresh_due and self.last_updated is None)):
+                response = client.from_('locations').select('*').execute()
+                self.rows = {}
+                self.last_updated = None
+                self.__merge(response.data)
+                self.loaded = True
+                self.last_full = self.last_check = now
+
+            elif refresh_due:
+                # Look back a little, a row can commit after a pull that already saw newer timestamps.
+                since = datetime.fromisoformat(self.last_updated) - timedelta(seconds=self.SNAPSHOT_LOOKBACK_SECONDS)
+                response = client.from_('locations').select('*').gte(
+                    self.UPDATED_AT_COLUMN, since.isoformat()).execute()
+                self.__merge(response.data)
+                self.last_check = now
 
+            return list(self.rows.values())
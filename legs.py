@@ -0,0 +1,148 @@
+from functools import lru_cache
+from heapq import heappop, heappush
+from typing import Iterator, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+from citypack import CityPack
+from constants import Constants
+
+
+class LegPaths(Constants):
+    # Inherit the constants from the Constants class
+    def __init__(self, G: nx.MultiDiGraph | CityPack, nodes: List[int]) -> None:
+        '''
+        Shortest distances and lazily reconstructed paths between stops.
+        Runs one Dijkstra per source and keeps the predecessors of the settled nodes only,
+        instead of storing a node list for every ordered pair of stops.
+        G is a networkx graph, or a city pack whose CSR arrays are searched directly.
+        Call distance_matrix() before path().
+        '''
+        self.G = G
+        self.nodes = list(nodes)
+
+        # Graph nodes are addressed by ordinal, so predecessors fit in int32 arrays.
+        if isinstance(G, CityPack):
+            # The pack is already sorted by node id, nothing is copied.
+            self.node_ids = G.node_ids
+            self.__node_index = G.node_index
+            self.__neighbors = G.neighbors
+        else:
+            self.node_ids = np.fromiter(G.nodes, dtype=np.int64, count=len(G))
+            self.__graph_index = {node: i for i, node in enumerate(G.nodes)}
+            self.__node_index = self.__graph_index.__getitem__
+            self.__neighbors = self.__graph_neighbors
+
+        self.predecessors = []
+
+        # Only the legs actually requested are unpacked, repeated ones come from the LRU.
+        self.__cached_path = lru_cache(maxsize=self.PATH_CACHE_SIZE)(self.__unpack)
+
+    def __edge_weight(self, edges: dict) -> float:
+        '''
+        Returns the edge length used by nx.shortest_path(weight='length').
+        Parallel edges of a multigraph are reduced to the shortest one.
+        '''
+        if self.G.is_multigraph():
+            return min(data.get('length', 1) for data in edges.values())
+        return edges.get('length', 1)
+
+    def __graph_neighbors(self, u: int) -> Iterator[Tuple[int, float]]:
+        '''
+        Returns (ordinal, length) of the out-neighbours of node ordinal u in a networkx graph.
+        '''
+        for v, edges in self.G.adj[int(self.node_ids[u])].items():
+            yield self.__graph_index[v], self.__edge_weight(edges)
+
+    def __dijkstra(self, source: int) -> Tuple[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        '''
+        Dijkstra from a single stop.
+        Stops early once every stop is settled.
+        Returns the distances to each stop (NaN if unreachable) and the predecessors:
+        the settled node ordinals (sorted) and the predecessor of each, -1 for the source.
+        '''
+        distances = np.full(len(self.nodes), np.nan)
+
+        targets = {}
+        for k, node in enumerate(self.nodes):
+            targets.setdefault(self.__node_index(node), []).append(k)
+
+        start = self.__node_index(source)
+        best = {start: 0.0}
+        # Predecessors of the frontier, moved to settled once a node is final.
+        parent = {start: -1}
+        settled = {}
+        heap = [(0.0, start)]
+
+        while heap and targets:
+            dist, u = heappop(heap)
+            if u in settled:
+                continue
+            settled[u] = parent.pop(u)
+
+            for k in targets.pop(u, []):
+                distances[k] = dist
+
+            for v, length in self.__neighbors(u):
+                if v in settled:
+                    continue
+                new_dist = dist + length
+                if new_dist < best.get(v, float('inf')):
+                    best[v] = new_dist
+                    parent[v] = u
+                    heappush(heap, (new_dist, v))
+
+        # Trimmed to the settled nodes, sorted for binary search.
+        nodes = np.fromiter(settled.keys(), dtype=self.PREDECESSOR_DTYPE, count=len(settled))
+        preds = np.fromiter(settled.values(), dtype=self.PREDECESSOR_DTYPE, count=len(settled))
+        order = np.argsort(nodes)
+
+        return distances, (nodes[order], preds[order])
+
+    def distance_matrix(self) -> np.ndarray:
+        '''
+        Runs Dijkstra from every stop and keeps the settled predecessors per source.
+        Returns the distance matrix in metres, which is not stored here.
+        '''
+        distances = np.full((len(self.nodes), len(self.nodes)), np.nan)
+        self.predecessors = []
+
+        for i, source in enumerate(self.nodes):
+            distances[i], pred = self.__dijkstra(source)
+            self.predecessors.append(pred)
+
+        # Diagonal is NaN, matching the previous DataFrame before scaling.
+        np.fill_diagonal(distances, np.nan)
+        return distances
+
+    def __unpack(self, i: int, j: int) -> Tuple[int, ...]:
+        '''
+        Walks the predecessors of stop i back from stop j.
+        '''
+        source = self.__node_index(self.nodes[i])
+        target = self.__node_index(self.nodes[j])
+        settled, predecessors = self.predecessors[i]
+
+        def predecessor(node: int) -> Optional[int]:
+            k = int(np.searchsorted(settled, node))
+            if k == len(settled) or settled[k] != node:
+                return None
+            return int(predecessors[k])
+
+        if predecessor(target) is None:
+            # Unreachable
+            return ()
+
+        path = [target]
+        while path[-1] != source:
+            path.append(predecessor(path[-1]))
+
+        return tuple(int(self.node_ids[k]) for k in reversed(path))
+
+    def path(self, i: int, j: int) -> List[int]:
+        '''
+        Returns the graph nodes on the shortest path from stop i to stop j.
+        Empty list if there is no path.
+        '''
+        return list(self.__cached_path(i, j))
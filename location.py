@@ -4,6 +4,8 @@ import geopandas as gpd
 import osmnx as ox
 from pandas import Series
 
+from citypack import CityPack
+
 class Locations():
     def __init__(self, locations: Series, 
                  progress_callback: Optional[Callable] = None) -> None:
@@ -19,12 +21,13 @@ class Locations():
     def init_locations(self, locations: Series) -> List[str]:
         '''
         Ensures there are no duplicate locations.
+        Keeps the input order, so the same input always gives the same stops.
         '''
         if locations.empty:
             return []
         
         start, *rest = locations
-        return [start] + list(set(rest))
+        return [start] + list(dict.fromkeys(rest))
 
     def __geocode_locations(self) -> Dict[str, Tuple[float, float]]:
         '''
@@ -33,10 +36,13 @@ class Locations():
         '''
         coordinates = {}
         total = len(self.locations)
+        # With a city pack loaded, addresses are looked up offline.
+        pack = CityPack.active()
+        geocode = pack.geocode if pack else ox.geocode
 
         for i, location in enumerate(self.locations):
             try:
-                coords = ox.geocode(location)
+                coords = geocode(location)
                 coordinates[location] = coords
 
             except Exception:
@@ -0,0 +1,123 @@
+import json
+import os
+from typing import List, Optional
+
+import numpy as np
+
+from constants import Constants
+
+
+class DistanceMatrix(Constants):
+    # Inherit the constants from the Constants class
+    def __init__(self, values: np.ndarray,
+                 labels: List[str],
+                 raw: Optional[np.ndarray] = None) -> None:
+        '''
+        Contiguous container for the scaled distance matrix.
+        Rows and columns are indexed by stop ordinal, labels are kept separately.
+        Stored asymmetric, since road distances depend on direction.
+        '''
+        self.values = np.ascontiguousarray(values, dtype=self.MATRIX_DTYPE)
+        self.labels = list(labels)
+        self.raw = None if raw is None else np.ascontiguousarray(raw, dtype=self.RAW_MATRIX_DTYPE)
+
+        self.__validate()
+
+    def __validate(self) -> None:
+        '''
+        Checks the matrix is square and matches the labels (and the raw matrix, if any).
+        '''
+        if self.values.ndim != 2 or self.values.shape[0] != self.values.shape[1]:
+            raise ValueError(f'Distance matrix must be square, got shape {self.values.shape}.')
+
+        if len(self.labels) != len(self.values):
+            raise ValueError(f'Expected {len(self.values)} labels, got {len(self.labels)}.')
+
+        if self.raw is not None and self.raw.shape != self.values.shape:
+            raise ValueError(f'Raw matrix shape {self.raw.shape} does not match {self.values.shape}.')
+
+    @classmethod
+    def from_meters(cls, meters: np.ndarray, labels: List[str], keep_raw: bool = False) -> 'DistanceMatrix':
+        '''
+        Builds the container from a float matrix of metres.
+        NaN (e.g. the diagonal or unreachable pairs) is treated as 0.
+        Scales by SCALE_FACTOR and rounds to integers for OR-Tools.
+        '''
+        meters = np.nan_to_num(np.asarray(meters, dtype=np.float64), nan=0.0)
+        scaled = np.rint(meters * cls.SCALE_FACTOR)
+
+        # Clip instead of wrapping around if a distance does not fit.
+        limit = np.iinfo(cls.MATRIX_DTYPE).max
+        scaled = np.clip(scaled, 0, limit)
+
+        raw = meters.astype(cls.RAW_MATRIX_DTYPE) if keep_raw else None
+        return cls(scaled.astype(cls.MATRIX_DTYPE), labels, raw)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    @property
+    def nbytes(self) -> int:
+        '''
+        Memory used by the matrix data (excluding labels).
+        '''
+        return self.values.nbytes + (self.raw.nbytes if self.raw is not None else 0)
+
+    def distance(self, i: int, j: int) -> int:
+        '''
+        Returns the scaled distance from stop i to stop j as a Python int.
+        '''
+        return int(self.values[i, j])
+
+    def meters(self, i: int, j: int) -> float:
+        '''
+        Returns the distance from stop i to stop j in metres.
+        Uses the raw matrix if present, otherwise unscales the integer matrix.
+        '''
+        if self.raw is not None:
+            return float(self.raw[i, j])
+        return int(self.values[i, j]) / self.SCALE_FACTOR
+
+    def save(self, directory: str) -> None:
+        '''
+        Saves the matrix to a directory as .npy files plus a labels JSON file.
+        '''
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'values.npy'), self.values)
+
+        if self.raw is not None:
+            np.save(os.path.join(directory, 'raw.npy'), self.raw)
+
+        with open(os.path.join(directory, 'labels.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.labels, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'DistanceMatrix':
+        '''
+        Loads a matrix saved with save().
+        By default the arrays are memory-mapped read-only, so several processes share the same pages.
+        '''
+        mmap_mode = 'r' if mmap else None
+
+        values = np.load(os.path.join(directory, 'values.npy'), mmap_mode=mmap_mode)
+
+        raw_path = os.path.join(directory, 'raw.npy')
+        raw = np.load(raw_path, mmap_mode=mmap_mode) if os.path.exists(raw_path) else None
+
+        with open(os.path.join(directory, 'labels.json'), encoding='utf-8') as f:
+            labels = json.load(f)
+
+        matrix = cls.__new__(cls)
+        # Skip __init__ to avoid copying the memory-mapped arrays.
+        matrix.values = values
+        matrix.labels = labels
+        matrix.raw = raw
+
+        if values.dtype != np.dtype(cls.MATRIX_DTYPE):
+            raise ValueError(f'Expected a {cls.MATRIX_DTYPE} matrix, got {values.dtype}.')
+
+        matrix.__validate()
+        return matrix
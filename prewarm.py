@@ -0,0 +1,153 @@
+import ast
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from constants import Constants
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class Prewarm():
+    @staticmethod
+    def cities() -> List[str]:
+        '''
+        Returns the cities from the comma separated PREWARM_CITIES variable.
+        '''
+        return [city.strip() for city in os.getenv('PREWARM_CITIES', '').split(',') if city.strip()]
+
+    @staticmethod
+    def import_solver_stack() -> Dict[str, float]:
+        '''
+        Imports the heavy solver modules.
+        Returns the import time in seconds per module.
+        '''
+        times = {}
+        for module in Constants.SOLVER_MODULES:
+            start = time.perf_counter()
+            importlib.import_module(module)
+            times[module] = time.perf_counter() - start
+
+        return times
+
+    @staticmethod
+    def load_graphs(cities: List[str]) -> None:
+        '''
+        Geocodes the predefined locations of each city and loads its road graph,
+        so the first solve for that city hits the in-process graph cache.
+        '''
+        # Imported here, the solver stack is loaded by import_solver_stack first.
+        import pandas as pd
+
+        from citypack import CityPack
+        from database import Database
+        from location import Locations
+        from tsp import TSP
+
+        if CityPack.active():
+            print('Prewarm: city pack loaded, solves use it instead of downloaded graphs')
+            return
+
+        city_list = Database().pull()
+
+        for city in cities:
+            if city not in city_list:
+                print(f'Prewarm: no predefined locations for {city}')
+                continue
+
+            try:
+                start = time.perf_counter()
+                loc_object = Locations(pd.Series(city_list[city]))
+                geometry = loc_object.gdf.geometry
+                TSP.load_graph(TSP.graph_center(geometry), TSP.graph_points(geometry))
+                print(f'Prewarm: loaded graph for {city} in {time.perf_counter() - start:.2f}s')
+
+            # Prewarming is best effort, the solve will load the graph itself.
+            except Exception as e:
+                print(f'Prewarm: failed to load graph for {city}: {e}')
+
+    @staticmethod
+    def run(cities: List[str]) -> None:
+        '''
+        Imports the solver stack and loads the graphs for the configured cities.
+        '''
+        times = Prewarm.import_solver_stack()
+
+        # Maps the city pack, if CITY_PACK is set.
+        from citypack import CityPack
+        CityPack.active()
+        print(f'Prewarm: solver stack imported in {sum(times.values()):.2f}s '
+              f'({", ".join(f"{m} {t:.2f}s" for m, t in times.items())})')
+
+        if cities:
+            Prewarm.load_graphs(cities)
+
+    @staticmethod
+    def start() -> Optional[threading.Thread]:
+        '''
+        Starts the prewarm step in a background thread if PREWARM is set.
+        PREWARM_CITIES is a comma separated list of predefined cities to load graphs for.
+        Returns the thread, or None if prewarming is disabled.
+        '''
+        load_dotenv()
+        if os.getenv('PREWARM', '').lower() not in ('1', 'true', 'yes'):
+            return None
+
+        thread = threading.Thread(target=Prewarm.run, args=(Prewarm.cities(),), daemon=True, name='prewarm')
+        thread.start()
+        return thread
+
+    @staticmethod
+    def page_imports(page: str) -> str:
+        '''
+        Returns the module level import statements of a page as source code.
+        '''
+        with open(os.path.join(ROOT, page), encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+
+        imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+        return '\n'.join(ast.unparse(node) for node in imports)
+
+    @staticmethod
+    def page_import_time(page: str) -> float:
+        '''
+        Measures the cold import time of a page in a fresh interpreter.
+        Only the module level imports are run, not the page itself.
+        '''
+        code = ('import time\n'
+                'start = time.perf_counter()\n'
+                f'{Prewarm.page_imports(page)}\n'
+                'print(time.perf_counter() - start)\n')
+
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        return float(result.stdout.strip().splitlines()[-1])
+
+    @staticmethod
+    def report() -> Dict[str, float]:
+        '''
+        Prints the cold import time of every Streamlit page.
+        '''
+        times = {}
+        for page in Constants.PAGES:
+            times[page] = Prewarm.page_import_time(page)
+            print(f'{page}: {times[page]:.2f}s')
+
+        return times
+
+
+if __name__ == '__main__':
+    # python prewarm.py          -> report the import time per page
+    # python prewarm.py --run    -> run the prewarm step in the foreground
+    if '--run' in sys.argv:
+        load_dotenv()
+        Prewarm.run(Prewarm.cities())
+    else:
+        Prewarm.report()
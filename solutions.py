@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from constants import Constants
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class SolutionCache(Constants):
+    # Inherit the constants from the Constants class
+
+    # Serializes index updates within the process, Streamlit sessions run in threads.
+    _lock = threading.Lock()
+
+    def __init__(self, folder: Optional[str] = None) -> None:
+        '''
+        Persistent cache of solved tours.
+        Keyed by the canonical stop set (depot plus sorted snapped node ids) and the solver settings,
+        so permutations of the same stops share one entry.
+        Entries live in one folder per depot and settings, with an index.json of their stop sets
+        to find near-identical stop sets without reading the entries.
+        The default folder is relative to this module, not the working directory.
+        '''
+        self.folder = folder or os.path.join(ROOT, self.SOLUTION_CACHE_FOLDER)
+
+    @staticmethod
+    def canonical(nodes: List[int]) -> Dict:
+        '''
+        Returns the canonical form of a stop set.
+        The first node is the depot, the rest are order independent.
+        '''
+        depot, *rest = [int(node) for node in nodes]
+        return {'depot': depot, 'stops': sorted(rest)}
+
+    @staticmethod
+    def __hash(data: Dict) -> str:
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:32]
+
+    @staticmethod
+    def __read_json(path: str) -> Optional[Dict]:
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def __write_json(path: str, data: Dict) -> None:
+        # Write then rename, so other processes never read a partial file.
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def __group_folder(self, depot: int, settings: Dict) -> str:
+        return os.path.join(self.folder, self.__hash({'depot': depot, 'settings': settings}))
+
+    def __key(self, nodes: List[int]) -> str:
+        return self.__hash(self.canonical(nodes))
+
+    def __index(self, folder: str) -> Dict[str, List[int]]:
+        '''
+        Returns the index of a group folder: entry key -> stops, oldest first.
+        '''
+        return self.__read_json(os.path.join(folder, 'index.json')) or {}
+
+    def __reconcile(self, folder: str) -> Dict[str, List[int]]:
+        '''
+        Returns the index of a group folder matched to the entry files on disk.
+        Another process may have replaced index.json concurrently and lost some entries,
+        so entries missing from the index are read back and stale keys are dropped.
+        Indexed entries keep their order, the missing ones follow by write time.
+        '''
+        index = self.__index(folder)
+
+        entries = []
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.name.endswith('.json') and entry.name != 'index.json':
+                    try:
+                        entries.append((entry.stat().st_mtime_ns, entry.name[:-len('.json')]))
+                    except OSError:
+                        # Evicted in the meantime.
+                        continue
+
+        on_disk = {key for _, key in entries}
+        reconciled = {key: stops for key, stops in index.items() if key in on_disk}
+
+        for _, key in sorted(entries):
+            if key not in reconciled:
+                data = self.__read_json(os.path.join(folder, f'{key}.json'))
+                if data is not None:
+                    reconciled[key] = data['stops']
+
+        return reconciled
+
+    def get(self, nodes: List[int], settings: Dict) -> Optional[Dict]:
+        '''
+        Returns the cached solution for this stop set, or None.
+        The solution holds the tour as node ids, the objective and the leg paths.
+        '''
+        folder = self.__group_folder(self.canonical(nodes)['depot'], settings)
+        return self.__read_json(os.path.join(folder, f'{self.__key(nodes)}.json'))
+
+    def nearest(self, nodes: List[int], settings: Dict) -> Optional[Dict]:
+        '''
+        Returns the cached solution with the same depot that contains the most of the current stops,
+        if it contains at least SOLUTION_WARM_START_OVERLAP of them.
+        Only the group index is read to compare stop sets.
+        '''
+        canonical = self.canonical(nodes)
+        stops = set(canonical['stops'])
+        folder = self.__group_folder(canonical['depot'], settings)
+
+        if not stops:
+            return None
+
+        best, best_overlap = None, 0.0
+        for key, cached in self.__index(folder).items():
+            overlap = len(stops & set(cached)) / len(stops)
+            if overlap > best_overlap:
+                best, best_overlap = key, overlap
+
+        if best is None or best_overlap < self.SOLUTION_WARM_START_OVERLAP:
+            return None
+
+        return self.__read_json(os.path.join(folder, f'{best}.json'))
+
+    def put(self, nodes: List[int], settings: Dict,
+            tour: List[int], objective: int, legs: List[List[int]]) -> None:
+        '''
+        Stores a solution.
+        tour is the node id of every stop in visiting order, legs the node paths between them.
+        Each group keeps at most SOLUTION_CACHE_MAX_ENTRIES, the oldest are evicted.
+        '''
+        canonical = self.canonical(nodes)
+        folder = self.__group_folder(canonical['depot'], settings)
+        key = self.__key(nodes)
+        os.makedirs(folder, exist_ok=True)
+
+        self.__write_json(os.path.join(folder, f'{key}.json'), {
+            **canonical,
+            'settings': settings,
+            'tour': [int(node) for node in tour],
+            'objective': int(objective),
+            'legs': [[int(node) for node in leg] for leg in legs],
+        })
+
+        with self._lock:
+            index = self.__reconcile(folder)
+            index.pop(key, None)
+            index[key] = canonical['stops']
+
+            while len(index) > self.SOLUTION_CACHE_MAX_ENTRIES:
+                oldest = next(iter(index))
+                del index[oldest]
+                self.__remove(os.path.join(folder, f'{oldest}.json'))
+
+            self.__write_json(os.path.join(folder, 'index.json'), index)
+
+    def drop(self, nodes: List[int], settings: Dict) -> None:
+        '''
+        Removes the cached solution for this stop set, e.g. when it no longer matches the graph.
+        '''
+        folder = self.__group_folder(self.canonical(nodes)['depot'], settings)
+        key = self.__key(nodes)
+
+        with self._lock:
+            self.__remove(os.path.join(folder, f'{key}.json'))
+
+            index = self.__index(folder)
+            if index.pop(key, None) is not None:
+                self.__write_json(os.path.join(folder, 'index.json'), index)
+
+    @staticmethod
+    def __remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
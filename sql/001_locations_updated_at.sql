@@ -0,0 +1,22 @@
+-- Adds the updated_at column used by the incremental snapshot refresh in database.py.
+-- Run once in the Supabase SQL editor (or psql) against the project database.
+
+alter table public.locations
+    add column if not exists updated_at timestamptz not null default clock_timestamp();
+
+-- clock_timestamp() rather than now(), so rows in a long transaction do not get
+-- a timestamp far older than their commit.
+create or replace function public.locations_set_updated_at() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at := clock_timestamp();
+    return new;
+end;
+$$;
+
+drop trigger if exists locations_set_updated_at on public.locations;
+create trigger locations_set_updated_at
+    before insert or update on public.locations
+    for each row execute function public.locations_set_updated_at();
+
+create index if not exists locations_updated_at_idx on public.locations (updated_at);
@@ -0,0 +1,36 @@
+import math
+import os
+import random
+import sys
+
+import networkx as nx
+import pytest
+
+# The modules live at the repository root, next to the Streamlit pages.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def road_graph() -> nx.MultiDiGraph:
+    '''
+    Small random road graph shaped like an osmnx graph:
+    OSM-like node ids with x (lon) and y (lat), directed edges with a length in metres,
+    some one-way streets and some parallel edges.
+    '''
+    rng = random.Random(7)
+    G = nx.MultiDiGraph(crs='epsg:4326')
+
+    for i in range(120):
+        G.add_node(1000 + 7 * i, y=29.70 + rng.random() * 0.05, x=-95.40 + rng.random() * 0.05)
+
+    nodes = list(G.nodes)
+    for _ in range(400):
+        u, v = rng.sample(nodes, 2)
+        dy = (G.nodes[u]['y'] - G.nodes[v]['y']) * 111320
+        dx = (G.nodes[u]['x'] - G.nodes[v]['x']) * 111320 * math.cos(math.radians(29.7))
+        length = math.hypot(dx, dy) * (1 + rng.random())
+        G.add_edge(u, v, length=length)
+        if rng.random() < 0.7:
+            G.add_edge(v, u, length=length)
+
+    return G
@@ -0,0 +1,121 @@
+import json
+import math
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from citypack import CityPack
+from legs import LegPaths
+
+OSM = '''<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="29.7000" lon="-95.4000">
+    <tag k="addr:housenumber" v="123"/>
+    <tag k="addr:street" v="Main Street"/>
+  </node>
+  <node id="2" lat="29.7100" lon="-95.3900"/>
+  <node id="3" lat="29.7300" lon="-95.3900"/>
+  <way id="10">
+    <nd ref="2"/>
+    <nd ref="3"/>
+    <tag k="addr:housenumber" v="5"/>
+    <tag k="addr:street" v="North Oak Avenue"/>
+  </way>
+  <node id="4" lat="29.7500" lon="-95.3500">
+    <tag k="addr:housenumber" v="123"/>
+    <tag k="addr:street" v="Main St"/>
+  </node>
+</osm>
+'''
+
+
+@pytest.fixture
+def pack(road_graph, tmp_path):
+    '''
+    Writes a pack the way CityPack.build does, from a graph instead of an extract.
+    '''
+    osm_path = tmp_path / 'city.osm'
+    osm_path.write_text(OSM, encoding='utf-8')
+
+    arrays = {**CityPack._CityPack__graph_arrays(road_graph),
+              **CityPack._CityPack__gazetteer_arrays(str(osm_path))}
+    arrays.update(CityPack._CityPack__grid_arrays(arrays['lat'], arrays['lon']))
+
+    folder = tmp_path / 'pack'
+    folder.mkdir()
+    for name in CityPack.PACK_ARRAYS:
+        np.save(folder / f'{name}.npy', arrays[name])
+    (folder / 'meta.json').write_text(json.dumps({'source': 'city.osm', 'grid_size': CityPack.PACK_GRID_SIZE,
+                                                  'nodes': len(arrays['node_ids']),
+                                                  'edges': len(arrays['indices'])}))
+
+    return CityPack(str(folder))
+
+
+def test_arrays_are_memory_mapped(pack):
+    assert all(isinstance(getattr(pack, name), np.memmap) for name in CityPack.PACK_ARRAYS)
+
+
+def test_csr_matches_graph(pack, road_graph):
+    assert pack.node_ids.tolist() == sorted(road_graph.nodes)
+
+    for u, node in enumerate(pack.node_ids.tolist()):
+        expected = {v: min(data['length'] for data in edges.values())
+                    for v, edges in road_graph.adj[node].items()}
+        actual = {int(pack.node_ids[v]): length for v, length in pack.neighbors(u)}
+        assert actual.keys() == expected.keys()
+        for v, length in actual.items():
+            assert length == pytest.approx(expected[v], rel=1e-6)
+
+
+def test_node_index(pack):
+    node = int(pack.node_ids[5])
+    assert pack.node_index(node) == 5
+    assert node in pack
+    assert 1 not in pack
+    with pytest.raises(KeyError):
+        pack.node_index(1)
+
+
+def test_nearest_nodes_match_brute_force(pack):
+    rng = random.Random(11)
+    # Includes points outside the grid extent.
+    lats = [29.65 + rng.random() * 0.15 for _ in range(200)]
+    lons = [-95.45 + rng.random() * 0.15 for _ in range(200)]
+
+    for lat, lon, node in zip(lats, lons, pack.nearest_nodes(lats, lons)):
+        cos_lat = math.cos(math.radians(lat))
+        dist = np.hypot((pack.lat - lat) * 111320, (pack.lon - lon) * 111320 * cos_lat)
+        assert dist[pack.node_index(node)] == pytest.approx(dist.min())
+
+
+def test_gazetteer(pack):
+    assert CityPack.normalize('123 Main Street, Houston, TX') == '123 main st'
+    assert pack.geocode('123 Main Street, Houston, TX') == (29.70, -95.40)
+    # Ways are placed at the mean of their nodes.
+    assert pack.geocode('5 N. Oak Ave') == pytest.approx((29.72, -95.39))
+    with pytest.raises(LookupError):
+        pack.geocode('7 Main Street')
+
+
+def test_graph_from_paths(pack):
+    path = pack.node_ids[:4].tolist()
+    G = pack.graph_from_paths([path])
+
+    assert list(G.nodes) == path
+    assert list(G.edges()) == list(zip(path, path[1:]))
+    assert G.nodes[path[0]]['y'] == pack.lat[0] and G.nodes[path[0]]['x'] == pack.lon[0]
+
+
+def test_leg_paths_on_pack_match_graph(pack, road_graph):
+    stops = random.Random(5).sample(list(road_graph.nodes), 10)
+
+    on_pack = LegPaths(pack, stops)
+    on_graph = LegPaths(road_graph, stops)
+
+    np.testing.assert_allclose(on_pack.distance_matrix(), on_graph.distance_matrix(), rtol=1e-5)
+    for i in range(len(stops)):
+        for j in range(len(stops)):
+            assert on_pack.path(i, j) == on_graph.path(i, j)
@@ -0,0 +1,219 @@
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import pandas as pd
+import pytest
+
+from database import Database, Snapshot
+
+
+class StubPostgREST(ThreadingHTTPServer):
+    '''
+    Minimal stand-in for the PostgREST endpoint of the locations table.
+    Supports select, eq and gte filters, upserts and deletes, and logs every request.
+    '''
+    def __init__(self) -> None:
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.rows = []
+        self.next_id = 1
+        self.requests = []
+        self.clock = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def tick(self) -> str:
+        # Stands in for the clock_timestamp() trigger.
+        self.clock += timedelta(seconds=1)
+        return self.clock.isoformat()
+
+    def insert(self, city: str, address: str, updated_at: str = None) -> dict:
+        with self.lock:
+            row = {'id': self.next_id, 'city': city, 'address': address,
+                   'updated_at': updated_at or self.tick()}
+            self.next_id += 1
+            self.rows.append(row)
+            return row
+
+    def matches(self, row: dict, filters: list) -> bool:
+        for column, condition in filters:
+            op, _, value = condition.partition('.')
+            if op == 'eq' and str(row[column]) != value:
+                return False
+            if op == 'gte' and datetime.fromisoformat(row[column]) < datetime.fromisoformat(value):
+                return False
+        return True
+
+    def reads(self) -> list:
+        return [query for method, query in self.requests if method == 'GET']
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def __filters(self):
+        query = parse_qsl(urlsplit(self.path).query)
+        self.server.requests.append((self.command, dict(query)))
+        return [(k, v) for k, v in query if k not in ('select', 'on_conflict', 'columns')]
+
+    def __reply(self, rows: list) -> None:
+        body = json.dumps(rows).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        filters = self.__filters()
+        with self.server.lock:
+            rows = [row for row in self.server.rows if self.server.matches(row, filters)]
+        self.__reply(rows)
+
+    def do_POST(self) -> None:
+        self.__filters()
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        rows = [self.server.insert(row['city'], row['address']) for row in body]
+        self.__reply(rows)
+
+    def do_DELETE(self) -> None:
+        filters = self.__filters()
+        with self.server.lock:
+            deleted = [row for row in self.server.rows if self.server.matches(row, filters)]
+            self.server.rows = [row for row in self.server.rows if row not in deleted]
+        self.__reply(deleted)
+
+
+@pytest.fixture
+def server():
+    server = StubPostgREST()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def database(server):
+    return Database(server.url, 'stub.anon.key')
+
+
+@pytest.fixture
+def refresh_always(monkeypatch):
+    monkeypatch.setattr(Snapshot, 'SNAPSHOT_REFRESH_SECONDS', -1)
+
+
+def test_client_is_pooled_per_url_and_key(server):
+    first = Database(server.url, 'stub.anon.key')
+    second = Database(server.url, 'stub.anon.key')
+    other = Database(server.url, 'other.anon.key')
+
+    assert first.client is second.client
+    assert first.snapshot is second.snapshot
+    assert other.client is not first.client
+
+
+def test_pull_is_served_from_the_snapshot(server, database):
+    server.insert('Berlin', 'Alexanderplatz')
+    server.insert('Paris', 'Louvre')
+
+    assert database.pull() == {'Berlin': ['Alexanderplatz'], 'Paris': ['Louvre']}
+    assert database.pull('Paris') == {'Paris': ['Louvre']}
+    assert len(server.reads()) == 1
+
+
+def test_single_city_pull_without_snapshot_queries_that_city(server, database):
+    server.insert('Berlin', 'Alexanderplatz')
+    server.insert('Paris', 'Louvre')
+
+    assert database.pull('Berlin') == {'Berlin': ['Alexanderplatz']}
+    assert server.reads() == [{'select': '*', 'city': 'eq.Berlin'}]
+    assert not database.snapshot.loaded
+
+
+def test_incremental_refresh_merges_by_key(server, database, refresh_always):
+    server.insert('Berlin', 'Alexanderplatz')
+    database.pull()
+
+    server.insert('Berlin', 'Tiergarten')
+    assert database.pull() == {'Berlin': ['Alexanderplatz', 'Tiergarten']}
+
+    full, incremental = server.reads()
+    assert 'updated_at' not in full
+    assert incremental['updated_at'].startswith('gte.')
+
+    # Rows read again by the overlapping window are not duplicated.
+    assert database.pull() == {'Berlin': ['Alexanderplatz', 'Tiergarten']}
+
+
+def test_incremental_refresh_sees_late_commit_with_older_timestamp(server, database, refresh_always):
+    newest = server.insert('Berlin', 'Alexanderplatz')
+    database.pull()
+
+    # Committed after the pull, but stamped with the same time as the newest row seen.
+    server.insert('Berlin', 'Tiergarten', updated_at=newest['updated_at'])
+    assert database.pull() == {'Berlin': ['Alexanderplatz', 'Tiergarten']}
+
+
+def test_no_refresh_within_interval(server, database, monkeypatch):
+    monkeypatch.setattr(Snapshot, 'SNAPSHOT_REFRESH_SECONDS', 3600)
+    server.insert('Berlin', 'Alexanderplatz')
+    database.pull()
+
+    server.insert('Berlin', 'Tiergarten')
+    assert database.pull() == {'Berlin': ['Alexanderplatz']}
+    assert len(server.reads()) == 1
+
+
+def test_ttl_expiry_does_full_pull_and_drops_deleted_rows(server, database, monkeypatch):
+    monkeypatch.setattr(Snapshot, 'SNAPSHOT_REFRESH_SECONDS', 3600)
+    server.insert('Berlin', 'Alexanderplatz')
+    server.insert('Berlin', 'Tiergarten')
+    database.pull()
+
+    # Deleted by another process, only a full pull can notice.
+    server.rows.pop()
+    monkeypatch.setattr(Snapshot, 'SNAPSHOT_TTL_SECONDS', -1)
+
+    assert database.pull() == {'Berlin': ['Alexanderplatz']}
+    assert [query for query in server.reads() if 'updated_at' not in query] == [{'select': '*'}] * 2
+
+
+def test_table_without_updated_at_falls_back_to_full_pulls(server, database, refresh_always):
+    server.rows.append({'id': 1, 'city': 'Berlin', 'address': 'Alexanderplatz'})
+    database.pull()
+
+    server.rows.append({'id': 2, 'city': 'Berlin', 'address': 'Tiergarten'})
+    assert database.pull() == {'Berlin': ['Alexanderplatz', 'Tiergarten']}
+    assert server.reads() == [{'select': '*'}] * 2
+
+
+def test_push_invalidates_snapshot(server, database, monkeypatch):
+    monkeypatch.setattr(Snapshot, 'SNAPSHOT_REFRESH_SECONDS', 3600)
+    server.insert('Berlin', 'Alexanderplatz')
+    database.pull()
+
+    original = pd.DataFrame({'address': ['Alexanderplatz']})
+    edited = pd.DataFrame({'address': ['Tiergarten']})
+    assert database.push('Berlin', edited, original) is True
+
+    assert not database.snapshot.loaded
+    assert database.pull() == {'Berlin': ['Tiergarten']}
+
+
+def test_delete_city_invalidates_snapshot(server, database, monkeypatch):
+    monkeypatch.setattr(Snapshot, 'SNAPSHOT_REFRESH_SECONDS', 3600)
+    server.insert('Berlin', 'Alexanderplatz')
+    server.insert('Paris', 'Louvre')
+    database.pull()
+
+    assert database.delete_city('Berlin') is True
+    assert not database.snapshot.loaded
+    assert database.pull() == {'Paris': ['Louvre']}
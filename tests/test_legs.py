@@ -0,0 +1,93 @@
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from legs import LegPaths
+
+
+@pytest.fixture
+def stops(road_graph):
+    return random.Random(3).sample(list(road_graph.nodes), 12)
+
+
+def path_length(G: nx.MultiDiGraph, path: list) -> float:
+    return sum(min(data['length'] for data in G[u][v].values()) for u, v in zip(path, path[1:]))
+
+
+def test_distance_matrix_matches_networkx(road_graph, stops):
+    legs = LegPaths(road_graph, stops)
+    matrix = legs.distance_matrix()
+
+    for i, source in enumerate(stops):
+        lengths = nx.single_source_dijkstra_path_length(road_graph, source, weight='length')
+        for j, target in enumerate(stops):
+            if i == j:
+                assert np.isnan(matrix[i, j])
+            elif target in lengths:
+                assert matrix[i, j] == pytest.approx(lengths[target])
+            else:
+                assert np.isnan(matrix[i, j])
+
+
+def test_paths_are_shortest(road_graph, stops):
+    legs = LegPaths(road_graph, stops)
+    matrix = legs.distance_matrix()
+
+    for i, source in enumerate(stops):
+        for j, target in enumerate(stops):
+            if i == j or np.isnan(matrix[i, j]):
+                continue
+            path = legs.path(i, j)
+            assert path[0] == source and path[-1] == target
+            assert all(road_graph.has_edge(u, v) for u, v in zip(path, path[1:]))
+            assert path_length(road_graph, path) == pytest.approx(matrix[i, j])
+
+
+def test_unreachable_stop_has_no_path():
+    G = nx.MultiDiGraph()
+    G.add_edge(1, 2, length=5.0)
+    G.add_node(3)
+
+    legs = LegPaths(G, [1, 2, 3])
+    matrix = legs.distance_matrix()
+
+    assert matrix[0, 1] == 5.0
+    assert np.isnan(matrix[0, 2]) and np.isnan(matrix[1, 0])
+    assert legs.path(0, 1) == [1, 2]
+    assert legs.path(0, 2) == []
+
+
+def test_parallel_edges_use_the_shortest():
+    G = nx.MultiDiGraph()
+    G.add_edge(1, 2, length=10.0)
+    G.add_edge(1, 2, length=4.0)
+    G.add_edge(2, 3, length=1.0)
+
+    legs = LegPaths(G, [1, 3])
+    assert legs.distance_matrix()[0, 1] == 5.0
+    assert legs.path(0, 1) == [1, 2, 3]
+
+
+def test_duplicate_stops_share_a_node():
+    G = nx.MultiDiGraph()
+    G.add_edge(1, 2, length=3.0)
+    G.add_edge(2, 1, length=3.0)
+
+    legs = LegPaths(G, [1, 2, 2])
+    matrix = legs.distance_matrix()
+
+    assert matrix[0, 1] == matrix[0, 2] == 3.0
+    assert matrix[1, 2] == 0.0
+    assert legs.path(1, 2) == [2]
+
+
+def test_predecessors_are_compact(road_graph, stops):
+    legs = LegPaths(road_graph, stops)
+    legs.distance_matrix()
+
+    for settled, predecessors in legs.predecessors:
+        assert settled.dtype == predecessors.dtype == np.dtype(LegPaths.PREDECESSOR_DTYPE)
+        assert len(settled) <= len(road_graph)
+        assert np.all(np.diff(settled) > 0)
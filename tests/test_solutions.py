@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+
+import pytest
+
+import solutions
+from solutions import SolutionCache
+
+SETTINGS = {'network_type': 'drive', 'scale_factor': 100}
+
+
+def solve(nodes):
+    # Stand-in tour: visit the stops in the given order and return to the depot.
+    tour = list(nodes) + [nodes[0]]
+    return {'tour': tour, 'objective': len(tour), 'legs': [[u, v] for u, v in zip(tour, tour[1:])]}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SolutionCache(str(tmp_path))
+
+
+def group_folder(tmp_path):
+    folders = [entry.path for entry in os.scandir(tmp_path) if entry.is_dir()]
+    assert len(folders) == 1
+    return folders[0]
+
+
+def test_default_folder_is_relative_to_the_module(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    folder = SolutionCache().folder
+
+    assert os.path.isabs(folder)
+    assert folder == os.path.join(os.path.dirname(os.path.abspath(solutions.__file__)),
+                                  SolutionCache.SOLUTION_CACHE_FOLDER)
+
+
+def test_permutations_share_an_entry(cache):
+    cache.put([1, 2, 3, 4], SETTINGS, **solve([1, 2, 3, 4]))
+
+    assert cache.get([1, 4, 3, 2], SETTINGS)['tour'] == [1, 2, 3, 4, 1]
+    # The depot is not interchangeable with the other stops.
+    assert cache.get([2, 1, 3, 4], SETTINGS) is None
+    assert cache.get([1, 2, 3, 4], {**SETTINGS, 'network_type': 'walk'}) is None
+
+
+def test_nearest_requires_enough_overlap(cache, monkeypatch):
+    monkeypatch.setattr(SolutionCache, 'SOLUTION_WARM_START_OVERLAP', 0.75)
+    cache.put([1, 2, 3, 4, 5], SETTINGS, **solve([1, 2, 3, 4, 5]))
+
+    assert cache.nearest([1, 2, 3, 4, 6], SETTINGS)['stops'] == [2, 3, 4, 5]
+    assert cache.nearest([1, 2, 3, 6, 7], SETTINGS) is None
+    assert cache.nearest([9, 2, 3, 4, 5], SETTINGS) is None
+
+
+def test_oldest_entries_are_evicted(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(SolutionCache, 'SOLUTION_CACHE_MAX_ENTRIES', 3)
+    for last in range(10, 15):
+        cache.put([1, 2, last], SETTINGS, **solve([1, 2, last]))
+
+    assert cache.get([1, 2, 10], SETTINGS) is None
+    assert cache.get([1, 2, 11], SETTINGS) is None
+    assert cache.get([1, 2, 14], SETTINGS) is not None
+
+    folder = group_folder(tmp_path)
+    with open(os.path.join(folder, 'index.json'), encoding='utf-8') as f:
+        assert list(json.load(f).values()) == [[2, 12], [2, 13], [2, 14]]
+    assert len(os.listdir(folder)) == 4
+
+
+def test_drop_removes_entry_and_index(cache, tmp_path):
+    cache.put([1, 2, 3], SETTINGS, **solve([1, 2, 3]))
+    cache.drop([1, 3, 2], SETTINGS)
+
+    assert cache.get([1, 2, 3], SETTINGS) is None
+    assert cache.nearest([1, 2, 3], SETTINGS) is None
+
+
+def test_index_lost_by_a_concurrent_writer_is_rebuilt(cache, tmp_path):
+    cache.put([1, 2, 3], SETTINGS, **solve([1, 2, 3]))
+    folder = group_folder(tmp_path)
+
+    # Another process replaced the index without the first entry.
+    with open(os.path.join(folder, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump({}, f)
+    assert cache.nearest([1, 2, 3], SETTINGS) is None
+
+    cache.put([1, 4, 5], SETTINGS, **solve([1, 4, 5]))
+    assert cache.nearest([1, 2, 3], SETTINGS)['stops'] == [2, 3]
+
+
+def test_concurrent_puts_are_all_indexed(cache, tmp_path):
+    stop_sets = [[1, 2, last] for last in range(10, 50)]
+    threads = [threading.Thread(target=cache.put, args=(nodes, SETTINGS), kwargs=solve(nodes))
+               for nodes in stop_sets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(os.path.join(group_folder(tmp_path), 'index.json'), encoding='utf-8') as f:
+        index = json.load(f)
+    assert sorted(index.values()) == sorted(nodes[1:] for nodes in stop_sets)
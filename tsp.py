@@ -1,65 +1,213 @@
-from itertools import cycle, permutations
-from typing import Dict, List
+import math
+import threading
+from collections import OrderedDict
+from itertools import cycle
+from typing import Dict, List, Tuple
 
 import folium
 import geopandas as gdf
 import networkx as nx
 import osmnx as ox
-import pandas as pd
 
 from ortools.constraint_solver import pywrapcp, routing_enums_pb2
 
 from constants import Constants
+from legs import LegPaths
+from citypack import CityPack
+from matrix import DistanceMatrix
+from solutions import SolutionCache
 from utilities import Utilities
 
 
 class TSP(Constants):
     # Inherit the constants from the Constants class
+
+    # Process-wide graph cache, shared by every solve and the prewarm step.
+    # Maps the download key to (graph, bounding box), any graph covering the stops is reused.
+    # One lock per key, so the same graph is never downloaded twice at once.
+    _graphs: 'OrderedDict[Tuple, Tuple[nx.Graph, Tuple[float, float, float, float]]]' = OrderedDict()
+    _graph_locks: Dict[Tuple, threading.Lock] = {}
+    _graph_lock = threading.Lock()
+
     def __init__(self, gdf: gdf.GeoDataFrame) -> None:
         # Geography data setup
         self.gdf = gdf
         self.locations = self.gdf.location
         self.streets = self.gdf.street
 
+        self.labels = self.streets.to_list()
+        self.settings = self.__solver_settings()
+
         # Graph creation
-        self.G = self.__create_graph()
+        self.G = self.__create_graph(self.settings['network_type'], self.settings['dist'])
         self.nodes = self.__get_nearest_nodes()
 
-        # Google OR-Tools setup
-        self.distance_matrix = self.__distance_matrix()
-        self.data = self.__create_data_model()
-        self.__ortools_setup()
+        # Same stops in any order come back from the solution cache
+        self.cache = SolutionCache()
+        cached = self.cache.get(self.nodes, self.settings)
+
+        # OSM data changes over time, an entry whose legs are no longer in the graph is re-solved.
+        if cached and not all(node in self.G for leg in cached['legs'] for node in leg):
+            self.cache.drop(self.nodes, self.settings)
+            cached = None
+
+        if cached:
+            self.path = self.__tour_to_path(cached['tour'])
+            self.path_between_nodes = cached['legs']
+            objective = cached['objective']
+
+        else:
+            # Google OR-Tools setup
+            self.distance_matrix = self.__distance_matrix()
+            self.data = self.__create_data_model()
+            self.__ortools_setup()
+
+            # Solve the TSP
+            self.solution = self.__solve()
+            self.path = self.__get_solution_path()
+            self.path_between_nodes = self.__solution_to_route()
+            objective = self.solution.ObjectiveValue()
+
+            self.cache.put(self.nodes, self.settings,
+                           tour=[self.nodes[i] for i in self.path],
+                           objective=objective,
+                           legs=self.path_between_nodes)
 
-        # Solve the TSP
-        self.solution = self.routing.SolveWithParameters(
-            self.search_parameters)
-        self.path = self.__get_solution_path()
-        self.path_between_nodes = self.__solution_to_route()
         # Divide by 100 to account for the scaling of the distance matrix
-        self.optimal_distance = self.solution.ObjectiveValue() / self.SCALE_FACTOR
+        self.optimal_distance = objective / self.SCALE_FACTOR
 
         # Map setup
-        self.tsp_route = {
-            **{f'{self.streets[0]}: Depot': 0},
-            **{self.streets[self.path[i]]: i for i in range(1, len(self.path))}
-        }
+        # With a city pack, only the drawn legs and the stops become a networkx graph.
+        if isinstance(self.G, CityPack):
+            self.route_graph = self.G.graph_from_paths(self.path_between_nodes + [[node] for node in self.nodes])
+        else:
+            self.route_graph = self.G
+        # (position, location index) pairs, so stops with the same street label stay separate.
+        self.tsp_route = list(enumerate(self.path))
         self.m = self.folium_map()
 
+    def __solver_settings(self) -> Dict:
+        '''
+        Settings that change the solution.
+        Part of the solution cache key.
+        '''
+        pack = CityPack.active()
+
+        return {
+            # Overpass and each city pack are separate graph sources.
+            'graph_source': pack.identity if pack else 'overpass',
+            'network_type': 'drive',
+            'dist': 10000,
+            # Using same algorithm as in my POC: Christofides
+            'first_solution_strategy': 'CHRISTOFIDES',
+            'scale_factor': self.SCALE_FACTOR,
+        }
+
+    @staticmethod
+    def graph_center(geometry: gdf.GeoSeries) -> Tuple[float, float]:
+        '''
+        Returns the center point used to download the graph for a set of locations.
+        Rounded to ~10 cm so float noise from stop order does not miss the graph cache.
+        '''
+        return tuple(round(c, 6) for c in Utilities.get_center(geometry))
+
+    @staticmethod
+    def graph_points(geometry: gdf.GeoSeries) -> List[Tuple[float, float]]:
+        '''
+        Returns the (lat, lon) of each location, the graph has to cover all of them.
+        The GeoDataFrame stores the latitude as x.
+        '''
+        return list(zip(geometry.x, geometry.y))
+
+    @classmethod
+    def __covers(cls, bbox: Tuple[float, float, float, float], lat: float, lon: float) -> bool:
+        '''
+        Whether (lat, lon) lies at least GRAPH_COVER_MARGIN metres inside the bounding box.
+        '''
+        south, north, west, east = bbox
+        margin_lat = cls.GRAPH_COVER_MARGIN / 111320
+        margin_lon = cls.GRAPH_COVER_MARGIN / (111320 * max(math.cos(math.radians(lat)), 1e-6))
+        return south + margin_lat <= lat <= north - margin_lat and west + margin_lon <= lon <= east - margin_lon
+
+    @classmethod
+    def __covering_graph(cls, points: List[Tuple[float, float]], network_type: str) -> nx.Graph | None:
+        '''
+        Returns the most recently used cached graph of this network type that covers every point, or None.
+        Must hold _graph_lock.
+        '''
+        for key, (G, bbox) in reversed(cls._graphs.items()):
+            if key[1] == network_type and all(cls.__covers(bbox, lat, lon) for lat, lon in points):
+                cls._graphs.move_to_end(key)
+                return G
+
+        return None
+
+    @classmethod
+    def load_graph(cls, center: Tuple[float, float],
+                   points: List[Tuple[float, float]],
+                   network_type: str = 'drive',
+                   dist: int = 10000) -> nx.Graph:
+        '''
+        Returns a road graph covering the (lat, lon) points.
+        Reuses any cached graph that covers them, otherwise downloads the graph around center.
+        Cached per process (at most GRAPH_CACHE_SIZE graphs), so solves and the prewarm step share graphs.
+        Failed downloads (None) are not cached.
+        The returned graph is shared and must not be modified.
+        '''
+        key = (tuple(float(c) for c in center), network_type, int(dist))
+
+        with cls._graph_lock:
+            G = cls.__covering_graph(points, network_type)
+            if G is not None:
+                return G
+            key_lock = cls._graph_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have loaded a covering graph while we waited.
+            with cls._graph_lock:
+                G = cls.__covering_graph(points, network_type)
+                if G is not None:
+                    return G
+
+            G = cls.__download_graph(*key)
+
+            with cls._graph_lock:
+                cls._graph_locks.pop(key, None)
+                if G is not None:
+                    lats = [lat for _, lat in G.nodes(data='y')]
+                    lons = [lon for _, lon in G.nodes(data='x')]
+                    cls._graphs[key] = (G, (min(lats), max(lats), min(lons), max(lons)))
+                    while len(cls._graphs) > cls.GRAPH_CACHE_SIZE:
+                        cls._graphs.popitem(last=False)
+
+        return G
+
+    @staticmethod
+    def __download_graph(center: Tuple[float, float], network_type: str, dist: int) -> nx.Graph:
+        '''
+        Downloads the road graph around a center point.
+        '''
+        try:
+            G = ox.graph_from_point(center, network_type=network_type, dist=dist)
+        except ox._errors.InsufficientResponseError:
+            return None
+
+        return G
+
     def __create_graph(self,
                        network_type: str = 'drive',
-                       dist: int = 10000) -> nx.Graph:
+                       dist: int = 10000) -> nx.Graph | CityPack:
         
         '''
         Creates a graph from the GeoDataFrame.
+        With a city pack loaded, the pack itself is the graph and no network call is made.
         '''
+        pack = CityPack.active()
+        if pack:
+            return pack
 
-        try:    
-            G = ox.graph_from_point(Utilities.get_center(
-                self.gdf.geometry), network_type=network_type, dist=dist)
-        except ox._errors.InsufficientResponseError:
-            return None
-        
-        return G
+        return self.load_graph(self.graph_center(self.gdf.geometry), self.graph_points(self.gdf.geometry),
+                               network_type=network_type, dist=dist)
 
     def __get_nearest_nodes(self) -> List[int]:
         '''
@@ -76,48 +224,25 @@ class TSP(Constants):
         #   points_rad = np.deg2rad(np.array([Y, X]).T) (its Y, X, not X, Y)
         # Lost, but it works...
 
-        nodes = ox.nearest_nodes(self.G, X=y, Y=x)
+        if isinstance(self.G, CityPack):
+            # Snapped with the pack's grid index, x is the latitude here.
+            nodes = self.G.nearest_nodes(lats=x, lons=y)
+        else:
+            nodes = ox.nearest_nodes(self.G, X=y, Y=x)
         self.gdf['nodes'] = nodes
 
         return nodes
 
-    def __scale_distance_matrix(self, distance_matrix: pd.DataFrame) -> pd.DataFrame:
-        '''
-        Scales the distance matrix to integers.
-        '''
-        # Convert diagonal from NaN to 0
-        distance_matrix.fillna(0, inplace=True)
-        # Scale by a factor of 100
-        distance_matrix = distance_matrix * self.SCALE_FACTOR
-        return distance_matrix.astype(int)
-
-    def __distance_matrix(self) -> pd.DataFrame:
+    def __distance_matrix(self) -> DistanceMatrix:
         '''
-        Returns a distance matrix dataframe.
-        Distance from every point to every other point.
+        Returns the distance matrix container.
+        Distance from every point to every other point, indexed by stop ordinal.
+        Paths are not stored here, they are unpacked on demand by LegPaths.
         '''
-        distance_matrix = pd.DataFrame(
-            index=self.streets.to_list(), columns=self.streets.to_list())
-        paths = {}
+        self.legs = LegPaths(self.G, self.nodes)
 
-        for i, j in permutations(range(len(self.nodes)), 2):
-            try:
-                distance = nx.shortest_path_length(
-                    self.G, source=self.nodes[i], target=self.nodes[j], weight='length')
-                distance_matrix.iloc[i, j] = distance
-
-                path = nx.shortest_path(
-                    self.G, source=self.nodes[i], target=self.nodes[j], weight='length')
-                paths[(self.nodes[i], self.nodes[j])] = path
-
-            except (nx.NodeNotFound, nx.NetworkXNoPath):
-                distance_matrix.iloc[i, j] = 0
-                paths[(self.nodes[i], self.nodes[j])] = []
-
-        self.paths = paths
-        distance_matrix = self.__scale_distance_matrix(distance_matrix)
-
-        return distance_matrix
+        # The float64 metres are only a temporary, the container keeps the int32 matrix alone.
+        return DistanceMatrix.from_meters(self.legs.distance_matrix(), self.labels)
 
     def __create_data_model(self, num_vehicles: int = 1, depot: int = 0) -> Dict:
         '''
@@ -128,7 +253,7 @@ class TSP(Constants):
         '''
         data = {}
 
-        data['distance_matrix'] = self.distance_matrix.values
+        data['distance_matrix'] = self.distance_matrix
         data['num_vehicles'] = num_vehicles
         data['depot'] = depot
 
@@ -143,7 +268,7 @@ class TSP(Constants):
         '''
         from_node = self.manager.IndexToNode(from_index)
         to_node = self.manager.IndexToNode(to_index)
-        return self.data['distance_matrix'][from_node][to_node]
+        return self.data['distance_matrix'].distance(from_node, to_node)
 
     def __ortools_setup(self) -> None:
         '''
@@ -163,13 +288,58 @@ class TSP(Constants):
             self.transit_callback_index)
 
         search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-        # Using same algorithm as in my POC: Christofides
-        search_parameters.first_solution_strategy = (
-            routing_enums_pb2.FirstSolutionStrategy.CHRISTOFIDES
-        )
+        search_parameters.first_solution_strategy = getattr(
+            routing_enums_pb2.FirstSolutionStrategy, self.settings['first_solution_strategy'])
 
         self.search_parameters = search_parameters
 
+    def __tour_to_path(self, tour: List[int]) -> List[int]:
+        '''
+        Maps a cached tour of node ids back to location indexes.
+        Node ids not in the current stops are skipped, stops sharing a node are used in order.
+        '''
+        available = {}
+        for i, node in enumerate(self.nodes[1:], start=1):
+            available.setdefault(int(node), []).append(i)
+
+        stops = [available[int(node)].pop(0) for node in tour[1:-1] if available.get(int(node))]
+
+        return [0] + stops + [0]
+
+    def __warm_start_route(self, cached: Dict) -> List[int]:
+        '''
+        Builds an initial route from a near-identical cached tour.
+        Stops missing from the cached tour are added by cheapest insertion.
+        Returns the route without the depot, as OR-Tools expects.
+        '''
+        route = self.__tour_to_path(cached['tour'])
+        distance = self.distance_matrix.distance
+
+        for stop in sorted(set(range(1, len(self.nodes))) - set(route)):
+            position = min(range(1, len(route)), key=lambda k: (
+                distance(route[k - 1], stop) + distance(stop, route[k]) - distance(route[k - 1], route[k])))
+            route.insert(position, stop)
+
+        return route[1:-1]
+
+    def __solve(self) -> pywrapcp.Assignment:
+        '''
+        Solves the TSP.
+        Warm-starts from the closest cached tour if one is similar enough.
+        '''
+        cached = self.cache.nearest(self.nodes, self.settings)
+
+        if cached:
+            self.routing.CloseModelWithParameters(self.search_parameters)
+            initial_solution = self.routing.ReadAssignmentFromRoutes(
+                [self.__warm_start_route(cached)], True)
+
+            if initial_solution:
+                return self.routing.SolveFromAssignmentWithParameters(
+                    initial_solution, self.search_parameters)
+
+        return self.routing.SolveWithParameters(self.search_parameters)
+
     def __get_solution_path(self) -> List[int]:
         '''
         Returns the optimal route as a list of indexes.
@@ -191,12 +361,9 @@ class TSP(Constants):
         # Get the optimal route
         optimal_route = self.path
 
-        # Get the nodes in the optimal route
-        nodes_in_route = [self.nodes[i] for i in optimal_route]
-
-        # Get the path between nodes in the optimal route
-        path_between_nodes = [self.paths[(node1, node2)] for node1, node2 in zip(
-            nodes_in_route, nodes_in_route[1:])]
+        # Unpack only the legs used by the optimal route
+        path_between_nodes = [self.legs.path(i, j) for i, j in zip(
+            optimal_route, optimal_route[1:])]
 
         return path_between_nodes
 
@@ -209,7 +376,8 @@ class TSP(Constants):
 
         legend_html = self.HTML_BASE
 
-        for location, i in self.tsp_route.items():
+        for i, stop in self.tsp_route:
+            location = f'{self.labels[stop]}: Depot' if i == 0 else self.labels[stop]
             legend_html += f"{i}: {location}<br>"
 
         legend_html += self.HTML_END
@@ -227,7 +395,7 @@ class TSP(Constants):
             nodes_per_road = []
             for node in road:
                 nodes_per_road.append(
-                    (self.G.nodes[node]['y'], self.G.nodes[node]['x']))
+                    (self.route_graph.nodes[node]['y'], self.route_graph.nodes[node]['x']))
 
             paths_between_locations.append(nodes_per_road)
 
@@ -253,21 +421,22 @@ class TSP(Constants):
                             weight=3, opacity=0.7).add_to(m)
 
         # Add marker for depot
-        coord = self.G.nodes[self.nodes[0]
-                             ]['y'], self.G.nodes[self.nodes[0]]['x']
+        coord = self.route_graph.nodes[self.nodes[0]
+                             ]['y'], self.route_graph.nodes[self.nodes[0]]['x']
         folium.Marker(coord,
                       icon=folium.Icon(color='green', icon='home'),
-                      popup=f'Depot: {self.streets[0]}').add_to(m)
+                      popup=f'Depot: {self.labels[0]}').add_to(m)
 
         # Add markers for the rest of the locations
         # Start at 1 and end at -1 to skip the depot
-        for stop in self.path[1:-1]:
-            loc = self.streets[stop]
+        # Stop numbers come from the position in the path, so duplicate street names do not collide.
+        for i, stop in enumerate(self.path[1:-1], start=1):
+            loc = self.labels[stop]
             node = self.nodes[stop]
-            coord = self.G.nodes[node]['y'], self.G.nodes[node]['x']
+            coord = self.route_graph.nodes[node]['y'], self.route_graph.nodes[node]['x']
             folium.Marker(coord,
                           icon=folium.Icon(icon='map-marker'),
-                          popup=f'Stop {self.tsp_route[loc]}: {loc}').add_to(m)
+                          popup=f'Stop {i}: {loc}').add_to(m)
 
         # Add legend to the map.
         m.get_root().html.add_child(folium.Element(self.__create_legend()))
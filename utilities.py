@@ -1,8 +1,5 @@
 from typing import List, Optional, Tuple, Dict
 
-import folium
-import geopandas as gpd
-import osmnx as ox
 import pandas as pd
 from dotenv import load_dotenv
 import streamlit as st
@@ -46,6 +43,9 @@ class Utilities():
         '''
         Geocodes a location or a list of locations.
         '''
+        # Imported here so pages that never geocode do not pay for osmnx.
+        import osmnx as ox
+
         if isinstance(location, str):
             location = [location]
 